@@ -1,32 +1,110 @@
 from __future__ import annotations
 
 import argparse
-import json
 import os
+import pickle
+import re
+from array import array
+from typing import Dict, Tuple
+
+import numpy as np
+import orjson
+
+from merge_utils import (
+    LEXICON_BIN_HEADER,
+    LEXICON_BIN_MAGIC,
+    LEXICON_BIN_RECORD,
+    decode_postings,
+    lexicon_bin_path,
+    lexicon_cache_path,
+    postings_columns_path,
+)
+
+
+# the exact shape merge_partials emits: {"term":"...","df":N,"enc":"<base64>"}
+_LEX_RE = re.compile(rb'\{"term":"((?:[^"\\]|\\.)*)","df":(\d+),"enc":"([A-Za-z0-9+/=]*)"\}')
+
+
+def write_lexicon_bin(path: str, lex: Dict[str, Tuple[int, int, int]]) -> None:
+    """
+    Write term -> (offset, df, row) as a sorted binary file that search can binary-search
+    through an mmap without loading it. Records are fixed-width so record i sits at a
+    computable position; terms live in a trailing byte area, so long terms stay exact.
+    """
+    terms = sorted(lex)
+    records = bytearray()
+    term_bytes = bytearray()
+    for term in terms:
+        t = term.encode("utf-8")
+        offset, df, row = lex[term]
+        records += LEXICON_BIN_RECORD.pack(len(term_bytes), len(t), offset, df, row)
+        term_bytes += t
+    with open(path, "wb", buffering=1 << 20) as f:
+        f.write(LEXICON_BIN_HEADER.pack(LEXICON_BIN_MAGIC, len(terms)))
+        f.write(records)
+        f.write(term_bytes)
 
 
 def build_lexicon(index_path: str, lexicon_path: str) -> int:
     """
     Build a lexicon mapping term -> byte offset in index_final.jsonl
-    Output format: TSV with columns: term \t offset \t df
+    Output format: TSV with columns: term \t offset \t df \t row
+    The same mapping is pickled to lexicon_cache_path(lexicon_path) for fast loading,
+    and written to lexicon_bin_path(lexicon_path) for mmap lookups (see write_lexicon_bin).
+    Also writes the postings column store next to the index (see postings_columns_path):
+    an int32 array of shape (5, total_postings) whose rows are doc_id, tf, title_tf,
+    header_tf, bold_tf; a term's postings are columns [row, row + df).
     Returns number of terms.
     """
-    term_count = 0
-    with open(index_path, "rb") as f_in, open(lexicon_path, "w", encoding="utf-8") as f_out:
-        while True:
-            offset = f_in.tell()
-            line = f_in.readline()
-            if not line:
-                break
-            line = line.strip()
-            if not line:
-                continue
-            obj = json.loads(line.decode("utf-8"))
-            term = obj["term"]
-            df = obj.get("df", 0)
-            f_out.write(f"{term}\t{offset}\t{df}\n")
-            term_count += 1
-    return term_count
+    columns_path = postings_columns_path(index_path)
+    tmp_paths = [f"{columns_path}.col{c}.tmp" for c in range(5)]
+    tmp_files = [open(p, "wb") for p in tmp_paths]
+
+    lex = {}
+    row = 0
+    next_offset = 0
+    try:
+        with open(index_path, "rb") as f_in, open(lexicon_path, "wb", buffering=1 << 20) as f_out:
+            for line in f_in:
+                # track offsets ourselves instead of a tell() per line
+                offset = next_offset
+                next_offset += len(line)
+                line = line.strip()
+                if not line:
+                    continue
+                m = _LEX_RE.fullmatch(line)
+                if m is not None and b"\\" not in m.group(1):
+                    term = m.group(1).decode("utf-8")
+                    df = int(m.group(2))
+                    enc = m.group(3).decode("ascii")
+                else:
+                    # escaped term or a writer we don't know: take the slow path
+                    obj = orjson.loads(line)
+                    term = obj["term"]
+                    df = obj.get("df", 0)
+                    enc = obj["enc"]
+                f_out.write(f"{term}\t{offset}\t{df}\t{row}\n".encode("utf-8"))
+                lex[term] = (offset, df, row)
+
+                # spill each column to its own temp file; total size is only known at the end
+                for f_col, col in zip(tmp_files, zip(*decode_postings(enc, df))):
+                    array("i", col).tofile(f_col)
+                row += df
+    finally:
+        for f_col in tmp_files:
+            f_col.close()
+
+    columns = np.lib.format.open_memmap(columns_path, mode="w+", dtype=np.int32, shape=(5, row))
+    for c, p in enumerate(tmp_paths):
+        columns[c] = np.fromfile(p, dtype=np.int32)
+        os.remove(p)
+    columns.flush()
+    del columns
+
+    with open(lexicon_cache_path(lexicon_path), "wb") as f:
+        pickle.dump(lex, f, protocol=pickle.HIGHEST_PROTOCOL)
+    write_lexicon_bin(lexicon_bin_path(lexicon_path), lex)
+    return len(lex)
 
 
 def main():
@@ -38,6 +116,8 @@ def main():
     os.makedirs(os.path.dirname(args.out), exist_ok=True)
     n = build_lexicon(args.index, args.out)
     print(f"Lexicon written to: {args.out}")
+    print(f"Binary lexicon:     {lexicon_bin_path(args.out)}")
+    print(f"Postings columns:   {postings_columns_path(args.index)}")
     print(f"Unique terms: {n}")
 
 
@@ -1,5 +1,86 @@
-from bs4 import BeautifulSoup
-from typing import Dict
+import re
+from typing import Dict, Optional
+
+import lxml.html
+from lxml import etree
+
+
+# compiled once, reused for every document
+_OPENER = re.compile(r"<!--|<(script|style)\b", re.IGNORECASE)
+_CLOSER = {
+    "script": re.compile(r"</script\b", re.IGNORECASE),
+    "style": re.compile(r"</style\b", re.IGNORECASE),
+}
+_TITLE = etree.XPath("//title")
+_HEADERS = etree.XPath("//h1|//h2|//h3")
+_BOLD = etree.XPath("//b|//strong")
+
+
+def _parse(html: str) -> Optional[etree._Element]:
+    """
+    Parse HTML with lxml (recovers from broken markup).
+    Returns None if lxml cannot build a tree at all.
+    """
+    try:
+        # document_fromstring always returns the <html> root; fromstring can hand back a bare
+        # comment / PI for pages like "<body><!-- x --></body>", which strip_elements rejects
+        return lxml.html.document_fromstring(html)
+    except ValueError:
+        # str input with an <?xml ... encoding=...?> declaration is rejected, bytes are not
+        try:
+            return lxml.html.document_fromstring(html.encode("utf-8", errors="ignore"))
+        except (etree.ParserError, ValueError):
+            return None
+    except etree.ParserError:
+        return None
+
+
+def _strip_scripts(html: str) -> str:
+    """
+    Cut <script>/<style> elements out of raw HTML in one left-to-right pass.
+    Comments are skipped over, so tags inside them are left alone. Any opener without a
+    closing tag stops stripping for that tag name; strip_elements handles what is left.
+    Each search resumes where the previous one ended, so the cost stays linear.
+    """
+    parts = []
+    pos = 0
+    unclosed = set()
+    while True:
+        m = _OPENER.search(html, pos)
+        if m is None:
+            break
+        if m.group(1) is None:
+            # comment: keep it (lxml drops it) and resume after it
+            end = html.find("-->", m.end())
+            if end < 0:
+                break
+            parts.append(html[pos:end + 3])
+            pos = end + 3
+            continue
+        name = m.group(1).lower()
+        if name in unclosed:
+            parts.append(html[pos:m.end()])
+            pos = m.end()
+            continue
+        close = _CLOSER[name].search(html, m.end())
+        gt = html.find(">", close.end()) if close is not None else -1
+        if gt < 0:
+            unclosed.add(name)
+            parts.append(html[pos:m.end()])
+            pos = m.end()
+            continue
+        parts.append(html[pos:m.start()])
+        parts.append(" ")
+        pos = gt + 1
+    if not parts:
+        return html
+    parts.append(html[pos:])
+    return "".join(parts)
+
+
+def _text(el: etree._Element) -> str:
+    # itertext keeps text nodes separate (text_content() would glue "<td>a</td><td>b</td>" into "ab")
+    return " ".join(" ".join(el.itertext()).split())
 
 
 def extract_zoned_text(html: str) -> Dict[str, str]:
@@ -9,52 +90,30 @@ def extract_zoned_text(html: str) -> Dict[str, str]:
         headers: <h1><h2><h3>
         bold: <b><strong>
         body: keep visible text
-    if parsing fails, fall back to plain text.
+    if lxml finds no document at all (e.g. only a doctype or a comment), every zone is empty.
     """
     if not html:
         return {"title": "", "headers": "", "bold": "", "body": ""}
 
-    try:
-        soup = BeautifulSoup(html, "lxml")
-    except Exception:
-        # fallback parser
-        soup = BeautifulSoup(html, "html.parser")
+    # drop script/style bodies before parsing so lxml never tokenizes them; their content
+    # is raw text to the parser, so no zone tag can live inside. noscript is left to
+    # strip_elements below, after zones are extracted, as are unclosed tags.
+    # A JS-only shell such as "<body><script>...</script><!-- analytics --></body>" is left
+    # with a comment-only body here; _parse still returns the <html> root for it.
+    if "<" in html[:256]:
+        html = _strip_scripts(html)
 
-    # Title
-    title_text = ""
-    try:
-        if soup.title and soup.title.string:
-            title_text = soup.title.get_text(" ", strip=True)
-    except Exception:
-        title_text = ""
-
-    # Headers
-    header_parts = []
-    for tag in soup.find_all(["h1", "h2", "h3"]):
-        try:
-            header_parts.append(tag.get_text(" ", strip=True))
-        except Exception:
-            continue
-    headers_text = " ".join(header_parts)
+    tree = _parse(html)
+    if tree is None:
+        return {"title": "", "headers": "", "bold": "", "body": ""}
 
-    # Bold
-    bold_parts = []
-    for tag in soup.find_all(["b", "strong"]):
-        try:
-            bold_parts.append(tag.get_text(" ", strip=True))
-        except Exception:
-            continue
-    bold_text = " ".join(bold_parts)
+    titles = _TITLE(tree)
+    title_text = _text(titles[0]) if titles else ""
+    headers_text = " ".join(_text(e) for e in _HEADERS(tree))
+    bold_text = " ".join(_text(e) for e in _BOLD(tree))
 
     # Body text (remove scripts/styles)
-    for bad in soup(["script", "style", "noscript"]):
-        try:
-            bad.decompose()
-        except Exception:
-            pass
-    try:
-        body_text = soup.get_text(" ", strip=True)
-    except Exception:
-        body_text = str(soup)
+    etree.strip_elements(tree, "script", "style", "noscript", with_tail=False)
+    body_text = _text(tree)
 
-    return {"title": title_text, "headers": headers_text, "bold": bold_text, "body": body_text}
\ No newline at end of file
+    return {"title": title_text, "headers": headers_text, "bold": bold_text, "body": body_text}
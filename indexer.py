@@ -1,9 +1,13 @@
 import argparse
+import hashlib
 import os
-from collections import Counter, defaultdict
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from typing import Dict, List, Tuple
 
-from io_utils import iter_json_docs, ensure_dir, file_size_kb, write_json
+import orjson
+
+from io_utils import list_json_files, iter_json_files, ensure_dir, file_size_kb, write_json
 from html_utils import extract_zoned_text
 from tokenizer import Tokenizer
 from merge_utils import dump_partial_index, merge_partials, Posting
@@ -24,94 +28,161 @@ def build_partial_index_for_doc(
     bold_tokens = tokenizer.tokenize(zoned_text.get("bold", ""))
     body_tokens = tokenizer.tokenize(zoned_text.get("body", ""))
 
-    c_title = Counter(title_tokens)
-    c_header = Counter(header_tokens)
-    c_bold = Counter(bold_tokens)
-    c_body = Counter(body_tokens)
+    # one traversal: term -> [title_tf, header_tf, bold_tf, body_tf]
+    counts: Dict[str, List[int]] = {}
+    for zone, tokens in enumerate((title_tokens, header_tokens, bold_tokens, body_tokens)):
+        for t in tokens:
+            r = counts.get(t)
+            if r is None:
+                r = counts[t] = [0, 0, 0, 0]
+            r[zone] += 1
 
     # total tf = body + title + header + bold
-    terms = set(c_title) | set(c_header) | set(c_bold) | set(c_body)
-    per_doc = {}
-    for t in terms:
-        title_tf = c_title.get(t, 0)
-        header_tf = c_header.get(t, 0)
-        bold_tf = c_bold.get(t, 0)
-        body_tf = c_body.get(t, 0)
-        tf = title_tf + header_tf + bold_tf + body_tf
-        per_doc[t] = (doc_id, tf, title_tf, header_tf, bold_tf)
-    return per_doc
-
-
-def main():
-    ap = argparse.ArgumentParser(description="CS121 Search Engine - Milestone 1 Indexer")
-    ap.add_argument("--corpus", required=True, help="Path to extracted dataset root (e.g., ./developer/ or ./analyst/)")
-    ap.add_argument("--out", default="./out_m1", help="Output directory for index files")
-    ap.add_argument("--use-stem", action="store_true", default=True, help="Enable Porter stemming (default on)")
-    ap.add_argument("--no-stem", dest="use_stem", action="store_false", help="Disable stemming")
-    ap.add_argument("--flush-docs", type=int, default=6000,
-                    help="Flush a partial index to disk every N documents (controls memory). Default 6000.")
-    args = ap.parse_args()
+    return {t: (doc_id, r[0] + r[1] + r[2] + r[3], r[0], r[1], r[2]) for t, r in counts.items()}
 
-    ensure_dir(args.out)
-    partial_dir = os.path.join(args.out, "partials")
-    ensure_dir(partial_dir)
 
-    tokenizer = Tokenizer(use_stem=args.use_stem)
+def _url_key(url: str) -> bytes:
+    """
+    Fixed 16-byte digest used for URL de-duplication, so the seen-set does not keep
+    every URL string alive for the whole run.
+    """
+    return hashlib.blake2b(url.encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+
+
+def _index_chunk(
+    chunk_files: List[str],
+    start_doc_id: int,
+    partial_dir: str,
+    worker_id: int,
+    use_stem: bool,
+    flush_docs: int,
+    flush_postings: int,
+) -> Tuple[List[str], str]:
+    """
+    Worker: index one slice of the corpus into its own partial_w{worker}_{seq}.jsonl files.
+    File k of the slice gets doc_id = start_doc_id + k.
+    The url per file (null if the file was unreadable or a duplicate inside this slice)
+    is streamed to urls_w{worker}.jsonl, one JSON value per line.
+    Returns (partial paths written by this call, urls path).
+    """
+    tokenizer = Tokenizer(use_stem=use_stem)
 
-    # doc_id -> url
-    doc_map: List[str] = []
+    urls_path = os.path.join(partial_dir, f"urls_w{worker_id:03d}.jsonl")
     seen_urls = set()
     # SPIMI in-memory partial index
     partial_index: Dict[str, List[Posting]] = defaultdict(list)
 
-    doc_count = 0
-    partial_count = 0
+    indexed = 0
+    buffered_postings = 0
+    partial_paths: List[str] = []
 
     def flush_partial():
-        nonlocal partial_index, partial_count
+        nonlocal partial_index, buffered_postings
+        buffered_postings = 0
         if not partial_index:
             return
-        partial_path = os.path.join(partial_dir, f"partial_{partial_count:04d}.jsonl")
+        partial_path = os.path.join(partial_dir, f"partial_w{worker_id:03d}_{len(partial_paths):04d}.jsonl")
         dump_partial_index(partial_path, partial_index)
-        partial_count += 1
+        partial_paths.append(partial_path)
         partial_index = defaultdict(list)
-    # loop through all doc
-    for _, url, content in iter_json_docs(args.corpus):
 
-        if url in seen_urls:
-            continue
-        seen_urls.add(url)
+    with open(urls_path, "wb", buffering=1 << 20) as urls_out:
+        for k, (_, doc) in enumerate(iter_json_files(chunk_files)):
+            key = _url_key(doc[0]) if doc is not None else None
+            if key is None or key in seen_urls:
+                urls_out.write(b"null\n")
+                continue
+            url, content = doc
+            seen_urls.add(key)
+            urls_out.write(orjson.dumps(url) + b"\n")
 
-        doc_id = doc_count
-        doc_map.append(url)
+            zoned = extract_zoned_text(content)
+            per_doc = build_partial_index_for_doc(start_doc_id + k, zoned, tokenizer)
 
-        zoned = extract_zoned_text(content)
-        per_doc = build_partial_index_for_doc(doc_id, zoned, tokenizer)
+            # append postings
+            for term, posting in per_doc.items():
+                partial_index[term].append(posting)
+            buffered_postings += len(per_doc)
 
-        # append postings
-        for term, posting in per_doc.items():
-            partial_index[term].append(posting)
+            indexed += 1
+            if indexed % flush_docs == 0 or buffered_postings >= flush_postings:
+                flush_partial()
 
-        doc_count += 1
+        # final flush
+        flush_partial()
+    return partial_paths, urls_path
 
-        if doc_count % args.flush_docs == 0:
-            flush_partial()
 
-    # final flush
-    flush_partial()
+def main():
+    ap = argparse.ArgumentParser(description="CS121 Search Engine - Milestone 1 Indexer")
+    ap.add_argument("--corpus", required=True, help="Path to extracted dataset root (e.g., ./developer/ or ./analyst/)")
+    ap.add_argument("--out", default="./out_m1", help="Output directory for index files")
+    ap.add_argument("--use-stem", action="store_true", default=True, help="Enable Porter stemming (default on)")
+    ap.add_argument("--no-stem", dest="use_stem", action="store_false", help="Disable stemming")
+    ap.add_argument("--flush-docs", type=int, default=6000,
+                    help="Flush a partial index to disk every N documents per worker (controls memory). Default 6000.")
+    ap.add_argument("--flush-postings", type=int, default=3_000_000,
+                    help="Also flush once a worker holds N postings in memory, so a run of long pages "
+                         "cannot blow the memory budget. Default 3000000.")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                    help="Number of indexing processes. Default: CPU count.")
+    args = ap.parse_args()
+
+    ensure_dir(args.out)
+    partial_dir = os.path.join(args.out, "partials")
+    ensure_dir(partial_dir)
+
+    # shard the file list into one contiguous slice per worker;
+    # doc_ids are file positions, so each slice's first doc_id is a prefix sum of slice sizes
+    files = list_json_files(args.corpus)
+    workers = max(1, min(args.workers, len(files)))
+    chunk_size = max(1, -(-len(files) // workers))
+    chunks = [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        futures = []
+        start_doc_id = 0
+        for worker_id, chunk in enumerate(chunks):
+            futures.append(ex.submit(
+                _index_chunk, chunk, start_doc_id, partial_dir, worker_id,
+                args.use_stem, args.flush_docs, args.flush_postings,
+            ))
+            start_doc_id += len(chunk)
+        results = [fut.result() for fut in futures]
+
+    # merge exactly what this run wrote: stale partials from an earlier run with a
+    # different worker count may still sit in partial_dir
+    partial_paths = [p for paths, _ in results for p in paths]
+    urls_paths = [urls_path for _, urls_path in results]
+
+    # doc map: line N of doc_id_to_url.jsonl is the url of doc_id N, streamed from the
+    # workers' url files in worker order so the full list is never held in memory.
+    # Unreadable / duplicate docs keep their doc_id slot as null; duplicates across slices
+    # were already indexed by their worker, so the merge drops them.
+    docmap_path = os.path.join(args.out, "doc_id_to_url.jsonl")
+    seen_urls = set()
+    dropped_doc_ids = set()
+    doc_id = 0
+    doc_count = 0
+    with open(docmap_path, "wb", buffering=1 << 20) as docmap_out:
+        for urls_path in urls_paths:
+            with open(urls_path, "rb") as f:
+                for line in f:
+                    url = orjson.loads(line)
+                    key = _url_key(url) if url is not None else None
+                    if key is None or key in seen_urls:
+                        if key is not None:
+                            dropped_doc_ids.add(doc_id)
+                        docmap_out.write(b"null\n")
+                    else:
+                        seen_urls.add(key)
+                        docmap_out.write(line)
+                        doc_count += 1
+                    doc_id += 1
 
     # merge partials
-    partial_paths = [
-        os.path.join(partial_dir, fn)
-        for fn in sorted(os.listdir(partial_dir))
-        if fn.endswith(".jsonl")
-    ]
     final_index_path = os.path.join(args.out, "index_final.jsonl")
-    unique_terms = merge_partials(partial_paths, final_index_path)
-
-    # write doc map
-    docmap_path = os.path.join(args.out, "doc_id_to_url.json")
-    write_json(docmap_path, {"doc_count": doc_count, "doc_id_to_url": doc_map})
+    unique_terms = merge_partials(partial_paths, final_index_path, skip_doc_ids=dropped_doc_ids)
 
     # compute size
     index_kb = file_size_kb(final_index_path)
@@ -125,6 +196,8 @@ def main():
         "partials_written": len(partial_paths),
         "stemming": args.use_stem,
         "flush_docs": args.flush_docs,
+        "flush_postings": args.flush_postings,
+        "workers": workers,
     }
     write_json(os.path.join(args.out, "m1_stats.json"), stats)
 
@@ -1,7 +1,11 @@
 import json
 import os
+import queue
+import threading
 from dataclasses import dataclass
-from typing import Iterator, Tuple, Optional
+from typing import Iterator, List, Tuple, Optional
+
+import orjson
 
 
 @dataclass
@@ -11,6 +15,9 @@ class DocRecord:
     content: str
 
 
+_END = object()  # end-of-input marker for the prefetch queue
+
+
 def _strip_fragment(url: str) -> str:
     # ignore fragment if present
     if not url:
@@ -18,24 +25,102 @@ def _strip_fragment(url: str) -> str:
     return url.split("#", 1)[0]
 
 
-def iter_json_docs(root_dir: str) -> Iterator[Tuple[str, str, str]]:
+def list_json_files(root_dir: str) -> List[str]:
     """
-    Yield (path, url, content) for every JSON file under root_dir.
+    All JSON file paths under root_dir, in os.walk order.
     one folder per domain, many JSON files inside.
     """
+    paths = []
     for dirpath, _, filenames in os.walk(root_dir):
         for fn in filenames:
-            if not fn.endswith(".json"):
-                continue
-            path = os.path.join(dirpath, fn)
+            if fn.endswith(".json"):
+                paths.append(os.path.join(dirpath, fn))
+    return paths
+
+
+def _drop_surrogates(s: str) -> str:
+    # lone surrogates (from escapes like "\ud83d") are not encodable; lxml stops reading at them
+    return s.encode("utf-8", errors="ignore").decode("utf-8")
+
+
+def parse_json_doc(raw: bytes) -> Optional[Tuple[str, str]]:
+    """
+    Decode one crawled page. Returns (url, content), or None if it is not valid JSON.
+    """
+    try:
+        try:
+            obj = orjson.loads(raw)
+            url = obj.get("url", "") or ""
+            content = obj.get("content", "") or ""
+        except orjson.JSONDecodeError:
+            # orjson rejects invalid UTF-8 and lone surrogate escapes; stdlib json accepts
+            # both once the bad bytes are dropped, then the surrogates are cleaned out
+            obj = json.loads(raw.decode("utf-8", errors="ignore"))
+            url = _drop_surrogates(obj.get("url", "") or "")
+            content = _drop_surrogates(obj.get("content", "") or "")
+        return _strip_fragment(url), content
+    except Exception:
+        return None
+
+
+def iter_json_files(paths: List[str], prefetch: int = 32) -> Iterator[Tuple[str, Optional[Tuple[str, str]]]]:
+    """
+    Yield (path, (url, content) or None) for every path, in order.
+    A background thread reads raw bytes up to `prefetch` files ahead (file reads release
+    the GIL), so disk reads overlap with JSON decoding and indexing in the caller.
+    """
+    q: "queue.Queue" = queue.Queue(maxsize=prefetch)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        # give up if the consumer went away, instead of blocking on a full queue forever
+        while not stop.is_set():
             try:
-                with open(path, "r", encoding="utf-8", errors="ignore") as f:
-                    obj = json.load(f)
-                url = _strip_fragment(obj.get("url", "") or "")
-                content = obj.get("content", "") or ""
-                yield path, url, content
-            except Exception:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
                 continue
+        return False
+
+    def reader():
+        try:
+            for path in paths:
+                try:
+                    with open(path, "rb") as f:
+                        raw = f.read()
+                except OSError:
+                    raw = None
+                if not put((path, raw)):
+                    return
+        except BaseException as e:
+            # hand anything else (e.g. MemoryError) to the consumer, which re-raises it
+            put(e)
+            return
+        put(_END)
+
+    t = threading.Thread(target=reader, name="json-prefetch", daemon=True)
+    t.start()
+    try:
+        while True:
+            item = q.get()
+            if item is _END:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            path, raw = item
+            yield path, (parse_json_doc(raw) if raw is not None else None)
+    finally:
+        stop.set()
+
+
+def iter_json_docs(root_dir: str) -> Iterator[Tuple[str, str, str]]:
+    """
+    Yield (path, url, content) for every JSON file under root_dir.
+    """
+    for path, doc in iter_json_files(list_json_files(root_dir)):
+        if doc is None:
+            continue
+        yield path, doc[0], doc[1]
 
 
 def ensure_dir(p: str) -> None:
@@ -47,5 +132,5 @@ def file_size_kb(path: str) -> float:
 
 
 def write_json(path: str, obj) -> None:
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+    with open(path, "wb") as f:
+        f.write(orjson.dumps(obj, option=orjson.OPT_INDENT_2))
\ No newline at end of file
@@ -1,64 +1,176 @@
+import base64
 import heapq
-import json
-from typing import Dict, List, Tuple, Iterator, Any
+import os
+import struct
+from itertools import accumulate
+from operator import itemgetter
+from typing import Dict, List, Tuple, Iterator, Any, Optional, Set
+
+import orjson
 
 
 Posting = Tuple[int, int, int, int, int]  # (doc_id, tf, title_tf, header_tf, bold_tf)
 
+# bytes collected in memory before each write() while dumping a partial
+_WRITE_BATCH = 4 << 20
+
+# binary lexicon (see build_lexicon.write_lexicon_bin): header, then one fixed-width record
+# per term in sorted term order, then the concatenated UTF-8 term bytes
+LEXICON_BIN_MAGIC = b"LEX1"
+LEXICON_BIN_HEADER = struct.Struct("<4sQ")  # magic, n_terms
+LEXICON_BIN_RECORD = struct.Struct("<QIQIQ")  # term_off (into term bytes), term_len, offset, df, row
+
 
 def dump_partial_index(path: str, index: Dict[str, List[Posting]]) -> None:
     """
     Write a partial index as JSONL:
       {"term":"...", "postings":[[doc_id, tf, title_tf, header_tf, bold_tf], ...]}
-    Written in sorted order.
+    Written in sorted term order, each postings list sorted by doc_id.
     """
-    with open(path, "w", encoding="utf-8") as f:
+    buf = bytearray()
+    with open(path, "wb", buffering=1 << 20) as f:
         for term in sorted(index.keys()):
             postings = index[term]
-            # postings already unique per doc_id in our construction
-            f.write(json.dumps({"term": term, "postings": postings}, ensure_ascii=False))
-            f.write("\n")
+            # postings already unique per doc_id in our construction, and appended in
+            # doc order, so this sort is a linear pass; it guarantees the merge invariant
+            postings.sort(key=itemgetter(0))
+            buf += orjson.dumps({"term": term, "postings": postings})
+            buf += b"\n"
+            if len(buf) >= _WRITE_BATCH:
+                f.write(buf)
+                buf.clear()
+        f.write(buf)
 
 
 def iter_partial(path: str) -> Iterator[Tuple[str, List[Posting]]]:
-    with open(path, "r", encoding="utf-8") as f:
+    with open(path, "rb") as f:
         for line in f:
             if not line.strip():
                 continue
-            obj = json.loads(line)
+            obj = orjson.loads(line)
             yield obj["term"], [tuple(p) for p in obj["postings"]]
 
 
 def merge_postings(a: List[Posting], b: List[Posting]) -> List[Posting]:
     """
-    Merge two postings lists
+    Merge two postings lists, both sorted by doc_id.
     If same doc_id appears, sum the fields.
     """
-    by = {}
-    for p in a:
-        by[p[0]] = p
-    for p in b:
-        doc_id = p[0]
-        if doc_id in by:
-            pa = by[doc_id]
-            by[doc_id] = (
-                doc_id,
-                pa[1] + p[1],
-                pa[2] + p[2],
-                pa[3] + p[3],
-                pa[4] + p[4],
-            )
+    out: List[Posting] = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        pa, pb = a[i], b[j]
+        if pa[0] < pb[0]:
+            out.append(pa)
+            i += 1
+        elif pb[0] < pa[0]:
+            out.append(pb)
+            j += 1
+        else:
+            out.append((pa[0], pa[1] + pb[1], pa[2] + pb[2], pa[3] + pb[3], pa[4] + pb[4]))
+            i += 1
+            j += 1
+    out.extend(a[i:])
+    out.extend(b[j:])
+    return out
+
+
+def merge_postings_many(chunks: List[List[Posting]]) -> List[Posting]:
+    """
+    m-way merge of postings lists that are each sorted by doc_id.
+    Consecutive equal doc_ids are folded by summing the fields.
+    """
+    if len(chunks) == 1:
+        return chunks[0]
+    if len(chunks) == 2:
+        return merge_postings(chunks[0], chunks[1])
+    out: List[Posting] = []
+    for p in heapq.merge(*chunks, key=itemgetter(0)):
+        if out and out[-1][0] == p[0]:
+            q = out[-1]
+            out[-1] = (q[0], q[1] + p[1], q[2] + p[2], q[3] + p[3], q[4] + p[4])
         else:
-            by[doc_id] = p
-    return [by[k] for k in sorted(by.keys())]
+            out.append(p)
+    return out
 
 
-def merge_partials(partial_paths: List[str], out_path: str) -> int:
+def _put_varbyte(buf: bytearray, n: int) -> None:
+    # 7 bits per byte, high bit set while more bytes follow
+    while n >= 0x80:
+        buf.append((n & 0x7F) | 0x80)
+        n >>= 7
+    buf.append(n)
+
+
+def encode_postings(postings: List[Posting]) -> str:
+    """
+    Encode a doc_id-sorted postings list as base64 varbyte, column by column:
+      doc_id gaps, then tf, title_tf, header_tf, bold_tf (df values each).
+    Small gaps and counts take one byte instead of several ASCII digits.
+    """
+    buf = bytearray()
+    prev = 0
+    for p in postings:
+        _put_varbyte(buf, p[0] - prev)
+        prev = p[0]
+    for col in range(1, 5):
+        for p in postings:
+            _put_varbyte(buf, p[col])
+    return base64.b64encode(buf).decode("ascii")
+
+
+def decode_postings(enc: str, df: int) -> List[Posting]:
+    """
+    Inverse of encode_postings.
+    """
+    vals = []
+    n = shift = 0
+    for b in base64.b64decode(enc):
+        if b & 0x80:
+            n |= (b & 0x7F) << shift
+            shift += 7
+        else:
+            vals.append(n | (b << shift))
+            n = shift = 0
+    doc_ids = accumulate(vals[:df])
+    return list(zip(
+        doc_ids, vals[df:2 * df], vals[2 * df:3 * df], vals[3 * df:4 * df], vals[4 * df:5 * df]
+    ))
+
+
+def postings_columns_path(index_path: str) -> str:
+    """
+    Where build_lexicon puts the numpy postings column store for a final index.
+    """
+    return os.path.splitext(index_path)[0] + ".postings.npy"
+
+
+def lexicon_cache_path(lexicon_path: str) -> str:
+    """
+    Where build_lexicon pickles the term -> (offset, df, row) dict next to the TSV lexicon.
+    """
+    return os.path.splitext(lexicon_path)[0] + ".pkl"
+
+
+def lexicon_bin_path(lexicon_path: str) -> str:
+    """
+    Where build_lexicon writes the sorted, memory-mappable binary lexicon.
+    """
+    return os.path.splitext(lexicon_path)[0] + ".bin"
+
+
+def merge_partials(
+    partial_paths: List[str],
+    out_path: str,
+    skip_doc_ids: Optional[Set[int]] = None,
+) -> int:
     """
     K-way merge all partial JSONL indexes into one final JSONL index.
+    Postings whose doc_id is in skip_doc_ids are dropped (e.g. duplicate URLs
+    found across indexer workers); a term left with no postings is not written.
     Returns: number of unique terms.
     Final format (JSONL):
-      {"term":"...", "df":123, "postings":[[doc_id, tf, title_tf, header_tf, bold_tf], ...]}
+      {"term":"...", "df":123, "enc":"<base64 varbyte postings, see encode_postings>"}
     """
     iters = [iter_partial(p) for p in partial_paths]
     heap: List[Tuple[str, int, List[Posting]]] = []
@@ -72,30 +184,37 @@ def merge_partials(partial_paths: List[str], out_path: str) -> int:
             pass
 
     unique_terms = 0
-    with open(out_path, "w", encoding="utf-8") as out:
+    # big buffer + one write() per term: the C-level writer coalesces lines into few syscalls
+    with open(out_path, "wb", buffering=4 << 20) as out:
         current_term = None
-        current_postings: List[Posting] = []
+        # every chunk of the current term, merged only once the term is complete
+        current_chunks: List[List[Posting]] = []
+
+        def flush_term():
+            nonlocal unique_terms
+            postings = merge_postings_many(current_chunks)
+            if skip_doc_ids:
+                postings = [p for p in postings if p[0] not in skip_doc_ids]
+                if not postings:
+                    return
+            out.write(orjson.dumps(
+                {"term": current_term, "df": len(postings), "enc": encode_postings(postings)}
+            ) + b"\n")
+            unique_terms += 1
 
         while heap:
             term, i, postings = heapq.heappop(heap)
 
             if current_term is None:
                 current_term = term
-                current_postings = postings
+                current_chunks = [postings]
             elif term == current_term:
-                current_postings = merge_postings(current_postings, postings)
+                current_chunks.append(postings)
             else:
-                # flush previous
-                df = len(current_postings)
-                out.write(json.dumps(
-                    {"term": current_term, "df": df, "postings": current_postings},
-                    ensure_ascii=False
-                ))
-                out.write("\n")
-                unique_terms += 1
-                # start new
+                # flush previous, start new
+                flush_term()
                 current_term = term
-                current_postings = postings
+                current_chunks = [postings]
 
             try:
                 nxt_term, nxt_postings = next(iters[i])
@@ -105,12 +224,6 @@ def merge_partials(partial_paths: List[str], out_path: str) -> int:
 
         # flush last
         if current_term is not None:
-            df = len(current_postings)
-            out.write(json.dumps(
-                {"term": current_term, "df": df, "postings": current_postings},
-                ensure_ascii=False
-            ))
-            out.write("\n")
-            unique_terms += 1
+            flush_term()
 
-    return unique_terms
\ No newline at end of file
+    return unique_terms
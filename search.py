@@ -1,85 +1,204 @@
 from __future__ import annotations
 
 import argparse
-import json
 import math
+import mmap
+import os
+import pickle
 from collections import defaultdict
-from dataclasses import dataclass
-from typing import Dict, List, Tuple
-
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import orjson
+
+from merge_utils import (
+    LEXICON_BIN_HEADER,
+    LEXICON_BIN_MAGIC,
+    LEXICON_BIN_RECORD,
+    Posting,
+    decode_postings,
+    lexicon_cache_path,
+    postings_columns_path,
+)
 from tokenizer import Tokenizer
 
 
-@dataclass
-class Posting:
-    doc_id: int
-    tf: int
-    title_tf: int
-    header_tf: int
-    bold_tf: int
-
-
 def load_docmap(docmap_path: str) -> Tuple[int, List[str]]:
-    with open(docmap_path, "r", encoding="utf-8") as f:
-        obj = json.load(f)
+    """
+    (doc_count, doc_id -> url). Accepts the streamed doc_id_to_url.jsonl
+    (line N = url of doc_id N, null for skipped files) or the older doc_id_to_url.json.
+    """
+    if docmap_path.endswith(".jsonl"):
+        with open(docmap_path, "rb") as f:
+            urls = [orjson.loads(line) for line in f]
+        return sum(u is not None for u in urls), urls
+
+    with open(docmap_path, "rb") as f:
+        obj = orjson.loads(f.read())
     urls = obj["doc_id_to_url"]
     return int(obj["doc_count"]), urls
 
 
-def load_lexicon(lexicon_path: str) -> Dict[str, Tuple[int, int]]:
+class MmapLexicon(Mapping):
     """
-    term -> (offset, df)
+    Read-only term -> (offset, df, row) mapping over the binary lexicon written by
+    build_lexicon.write_lexicon_bin. Lookups binary-search the sorted fixed-width records
+    through an mmap, so nothing is loaded up front: O(log n) page touches per term.
     """
+
+    def __init__(self, path: str):
+        self._f = open(path, "rb")
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self._n = LEXICON_BIN_HEADER.unpack_from(self._mm, 0)
+        if magic != LEXICON_BIN_MAGIC:
+            raise ValueError(f"not a binary lexicon: {path}")
+        self._terms_start = LEXICON_BIN_HEADER.size + self._n * LEXICON_BIN_RECORD.size
+
+    def _record(self, i: int) -> Tuple[int, int, int, int, int]:
+        return LEXICON_BIN_RECORD.unpack_from(self._mm, LEXICON_BIN_HEADER.size + i * LEXICON_BIN_RECORD.size)
+
+    def _term(self, rec: Tuple[int, int, int, int, int]) -> bytes:
+        start = self._terms_start + rec[0]
+        return self._mm[start:start + rec[1]]
+
+    def __getitem__(self, term: str) -> Tuple[int, int, int]:
+        key = term.encode("utf-8")
+        lo, hi = 0, self._n
+        while lo < hi:
+            mid = (lo + hi) // 2
+            rec = self._record(mid)
+            t = self._term(rec)
+            if t < key:
+                lo = mid + 1
+            elif t > key:
+                hi = mid
+            else:
+                return rec[2], rec[3], rec[4]
+        raise KeyError(term)
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(self._n):
+            yield self._term(self._record(i)).decode("utf-8")
+
+    def close(self) -> None:
+        self._mm.close()
+        self._f.close()
+
+
+def load_lexicon(lexicon_path: str) -> Mapping[str, Tuple[int, int, int]]:
+    """
+    term -> (offset, df, row)
+    A .bin path opens the binary lexicon as an MmapLexicon (no up-front load).
+    Otherwise uses the pickle written by build_lexicon when it is at least as new as the TSV.
+    """
+    if lexicon_path.endswith(".bin"):
+        return MmapLexicon(lexicon_path)
+
+    cache_path = lexicon_cache_path(lexicon_path)
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(lexicon_path):
+        with open(cache_path, "rb") as f:
+            return pickle.load(f)
+
     lex = {}
     with open(lexicon_path, "r", encoding="utf-8") as f:
         for line in f:
             line = line.rstrip("\n")
             if not line:
                 continue
-            term, off, df = line.split("\t")
-            lex[term] = (int(off), int(df))
+            term, off, df, row = line.split("\t")
+            lex[term] = (int(off), int(df), int(row))
     return lex
 
 
+@lru_cache(maxsize=None)
+def load_postings_columns(index_path: str) -> np.ndarray:
+    """
+    Memory-map the (5, total_postings) int32 column store written by build_lexicon.
+    Rows: doc_id, tf, title_tf, header_tf, bold_tf. Loaded once per index.
+    """
+    return np.load(postings_columns_path(index_path), mmap_mode="r")
+
+
+def read_postings_columns(index_path: str, df: int, row: int) -> np.ndarray:
+    """
+    One term's postings as a (5, df) view of the column store, sorted by doc_id.
+    """
+    return load_postings_columns(index_path)[:, row:row + df]
+
+
 def read_postings_at_handle(f, offset: int) -> Tuple[str, int, List[Posting]]:
     """
     Seek to offset in an already-open index file handle,
-    read one JSON line, and parse postings.
+    read one JSON line, and decode its postings.
     """
     f.seek(offset)
     line = f.readline()
-    obj = json.loads(line.decode("utf-8"))
+    obj = orjson.loads(line)
 
     term = obj["term"]
     df = int(obj.get("df", 0))
-    postings = []
-    for p in obj["postings"]:
-        postings.append(Posting(int(p[0]), int(p[1]), int(p[2]), int(p[3]), int(p[4])))
+    # plain (doc_id, tf, title_tf, header_tf, bold_tf) tuples, as the indexer writes them
+    postings = decode_postings(obj["enc"], df)
     return term, df, postings
 
 
-def intersect_docsets(postings_lists: List[List[Posting]]) -> Dict[int, List[Posting]]:
+@lru_cache(maxsize=4096)
+def read_postings_at(index_path: str, offset: int) -> Tuple[str, int, Tuple[Posting, ...]]:
+    """
+    Cached read of one term's postings. Repeated and overlapping queries in one
+    session (interactive loop, run_m2/run_m3 batches) skip the seek + decode.
+    Returned as a tuple since the same object is handed to every caller.
+    """
+    with open(index_path, "rb") as f:
+        term, df, postings = read_postings_at_handle(f, offset)
+    return term, df, tuple(postings)
+
+
+@lru_cache(maxsize=65536)
+def idf_for(N: int, df: int) -> float:
     """
-    AND-only intersection on doc_id.
-    Returns: doc_id -> list of corresponding postings (one per query term)
+    idf = log((N+1)/(df+1)) + 1, cached: ranked scoring asks for it once per posting.
+    """
+    return math.log((N + 1.0) / (df + 1.0)) + 1.0
+
+
+def intersect_docsets(postings_lists: List[np.ndarray]) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    AND-only intersection on doc_id over (5, df) postings columns.
+    Returns: (sorted common doc_ids, per-term (5, n) postings restricted to those docs),
+    the per-term blocks in the same order as postings_lists.
     """
     if not postings_lists:
-        return {}
-
-    # Start from smallest df list for speed
-    postings_lists.sort(key=len)
-    base = {p.doc_id: [p] for p in postings_lists[0]}
-
-    for lst in postings_lists[1:]:
-        cur = {}
-        ids = {p.doc_id: p for p in lst}
-        for doc_id, acc in base.items():
-            if doc_id in ids:
-                cur[doc_id] = acc + [ids[doc_id]]
-        base = cur
-        if not base:
-            break
-    return base
+        return np.empty(0, dtype=np.int32), []
+
+    # Start from smallest df list for speed; cand only ever shrinks
+    order = sorted(range(len(postings_lists)), key=lambda k: postings_lists[k].shape[1])
+    first = order[0]
+    cand = postings_lists[first][0]
+    # term index -> column of each surviving candidate in that term's list
+    rows = {first: np.arange(len(cand))}
+
+    for k in order[1:]:
+        ids = postings_lists[k][0]
+        # binary search of every candidate in the (sorted) longer list:
+        # O(|cand| log |ids|), which is what galloping buys when sizes are lopsided
+        idx = np.searchsorted(ids, cand)
+        valid = idx < len(ids)
+        valid[valid] = ids[idx[valid]] == cand[valid]
+        cand = cand[valid]
+        if not len(cand):
+            return cand, [lst[:, :0] for lst in postings_lists]
+        for j in rows:
+            rows[j] = rows[j][valid]
+        rows[k] = idx[valid]
+
+    hits = [lst[:, rows[k]] for k, lst in enumerate(postings_lists)]
+    return cand, hits
 
 
 def score_single_term_posting(
@@ -91,11 +210,11 @@ def score_single_term_posting(
     """
     TF-IDF contribution of one query term in one document.
     """
-    idf = math.log((N + 1.0) / (df + 1.0)) + 1.0
+    idf = idf_for(N, df)
 
-    tf = float(p.tf)
+    tf = float(p[1])
     if use_importance_boost:
-        tf += 5.0 * p.title_tf + 3.0 * p.header_tf + 1.5 * p.bold_tf
+        tf += 5.0 * p[2] + 3.0 * p[3] + 1.5 * p[4]
 
     tfw = 1.0 + math.log(tf) if tf > 0 else 0.0
     return tfw * (idf ** 2)
@@ -111,35 +230,52 @@ def normalize_query_terms(query: str, tokenizer: Tokenizer) -> List[str]:
     return list(dict.fromkeys(terms))
 
 def score_doc_tf_idf(
-    doc_postings: List[Posting],
+    hits: List[np.ndarray],
     dfs: List[int],
     N: int,
     use_importance_boost: bool = True
-) -> float:
+) -> np.ndarray:
     """
-    Score a doc for a multi-term query:
+    Score every intersected doc for a multi-term query at once:
     sum over terms: (weighted_tf) * idf
     idf = log((N+1)/(df+1)) + 1
     weighted_tf includes boosts for title/header/bold
+    hits: per-term (5, n_docs) postings columns, aligned by doc.
     """
-    score = 0.0
-    for p, df in zip(doc_postings, dfs):
-        idf = math.log((N + 1.0) / (df + 1.0)) + 1.0
+    if not hits:
+        return np.zeros(0, dtype=np.float64)
+
+    # (n_terms, 5, n_docs) -> (n_docs, n_terms) weighted tf matrix
+    cols = np.stack(hits).astype(np.float64)
+    tf = cols[:, 1]
+    if use_importance_boost:
+        tf = tf + 5.0 * cols[:, 2] + 3.0 * cols[:, 3] + 1.5 * cols[:, 4]
+    tf = tf.T
+
+    # log-tf helps stability
+    tfw = np.where(tf > 0, 1.0 + np.log(np.where(tf > 0, tf, 1.0)), 0.0)
+    idf = np.log((N + 1.0) / (np.asarray(dfs, dtype=np.float64) + 1.0)) + 1.0
+    return tfw @ (idf ** 2)
 
-        tf = float(p.tf)
-        if use_importance_boost:
-            tf += 5.0 * p.title_tf + 3.0 * p.header_tf + 1.5 * p.bold_tf
 
-        # log-tf helps stability
-        tfw = 1.0 + math.log(tf) if tf > 0 else 0.0
-        score += tfw * (idf ** 2)
-    return score
+def _top_k(scores: np.ndarray, topk: int) -> np.ndarray:
+    """
+    Indices of the topk highest scores, best first; ties keep index order.
+    np.partition finds the cut-off in O(n) so only the survivors get sorted.
+    """
+    n = len(scores)
+    if 0 < topk < n:
+        kth = np.partition(scores, n - topk)[n - topk]
+        idx = np.flatnonzero(scores >= kth)
+    else:
+        idx = np.arange(n)
+    return idx[np.argsort(-scores[idx], kind="stable")][:max(topk, 0)]
 
 
 def search_and(
     query: str,
     index_path: str,
-    lexicon: Dict[str, Tuple[int, int]],
+    lexicon: Mapping[str, Tuple[int, int, int]],
     tokenizer: Tokenizer,
     N: int,
     topk: int = 10,
@@ -153,45 +289,35 @@ def search_and(
     if not terms:
         return []
 
-
-    postings_lists: List[List[Posting]] = []
+    postings_lists: List[np.ndarray] = []
     dfs: List[int] = []
 
-    with open(index_path, "rb") as f:
-        for t in terms:
-            if t not in lexicon:
-                return []
-            offset, df = lexicon[t]
-            _, _, postings = read_postings_at_handle(f, offset)
-            postings_lists.append(postings)
-            dfs.append(df)
-
-    doc_to_postings = intersect_docsets(postings_lists)
-    if not doc_to_postings:
+    for t in terms:
+        if t not in lexicon:
+            return []
+        _, df, row = lexicon[t]
+        # dfs[i] stays paired with postings_lists[i]: intersect_docsets does not reorder
+        # its input, so each term is scored with its own idf
+        postings_lists.append(read_postings_columns(index_path, df, row))
+        dfs.append(df)
+
+    doc_ids, hits = intersect_docsets(postings_lists)
+    if not len(doc_ids):
         return []
 
     if not rank:
-        return [(doc_id, 0.0) for doc_id in list(doc_to_postings.keys())[:topk]]
-
-    # reorder dfs to match sorted postings_lists
-    # rebuild dfs in same df-sorted ordre
-    pairs = list(zip(dfs, postings_lists))
-    pairs.sort(key=lambda x: len(x[1]))
-    dfs_sorted = [x[0] for x in pairs]
+        return [(int(doc_id), 0.0) for doc_id in doc_ids[:topk]]
 
-    scored = []
-    for doc_id, plist in doc_to_postings.items():
-        s = score_doc_tf_idf(plist, dfs_sorted, N, use_importance_boost=True)
-        scored.append((doc_id, s))
-
-    scored.sort(key=lambda x: x[1], reverse=True)
-    return scored[:topk]
+    scores = score_doc_tf_idf(hits, dfs, N, use_importance_boost=True)
+    # ties keep ascending doc_id order
+    top = _top_k(scores, topk)
+    return [(int(doc_ids[k]), float(scores[k])) for k in top]
 
 
 def search_ranked(
     query: str,
     index_path: str,
-    lexicon: Dict[str, Tuple[int, int]],
+    lexicon: Mapping[str, Tuple[int, int, int]],
     tokenizer: Tokenizer,
     N: int,
     topk: int = 10
@@ -215,24 +341,24 @@ def search_ranked(
     doc_title_match_count: Dict[int, int] = defaultdict(int)
     term_to_docs: Dict[str, set] = {}
 
-    with open(index_path, "rb") as f:
-        for t in terms:
-            if t not in lexicon:
-                continue
+    for t in terms:
+        if t not in lexicon:
+            continue
 
-            offset, df = lexicon[t]
-            _, _, postings = read_postings_at_handle(f, offset)
-            valid_term_count += 1
-            term_to_docs[t] = {p.doc_id for p in postings}
+        offset, df, _ = lexicon[t]
+        _, _, postings = read_postings_at(index_path, offset)
+        valid_term_count += 1
+        term_to_docs[t] = {p[0] for p in postings}
 
-            for p in postings:
-                doc_scores[p.doc_id] += score_single_term_posting(
-                    p, df, N, use_importance_boost=True
-                )
-                doc_match_count[p.doc_id] += 1
+        for p in postings:
+            doc_id = p[0]
+            doc_scores[doc_id] += score_single_term_posting(
+                p, df, N, use_importance_boost=True
+            )
+            doc_match_count[doc_id] += 1
 
-                if p.title_tf > 0:
-                    doc_title_match_count[p.doc_id] += 1
+            if p[2] > 0:
+                doc_title_match_count[doc_id] += 1
 
     if valid_term_count == 0:
         return []
@@ -304,8 +430,8 @@ def interactive_loop(args):
 def main():
     ap = argparse.ArgumentParser(description="Milestone 2 Search (AND-only) over disk index")
     ap.add_argument("--index", required=True, help="Path to index_final.jsonl")
-    ap.add_argument("--lexicon", required=True, help="Path to lexicon.tsv")
-    ap.add_argument("--docmap", required=True, help="Path to doc_id_to_url.json")
+    ap.add_argument("--lexicon", required=True, help="Path to lexicon.tsv (or lexicon.bin to mmap it)")
+    ap.add_argument("--docmap", required=True, help="Path to doc_id_to_url.jsonl (or legacy .json)")
     ap.add_argument("--topk", type=int, default=10, help="Top K results to show")
     ap.add_argument("--rank", action="store_true", default=True, help="Enable TF-IDF ranking (default ON)")
     ap.add_argument("--no-rank", dest="rank", action="store_false", help="Disable ranking (AND-only, unsorted)")
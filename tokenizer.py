@@ -1,20 +1,36 @@
 import re
+import sys
 from typing import List, Optional
-from nltk.stem import PorterStemmer
 
+import Stemmer
 
-_TOKEN_RE = re.compile(r"[A-Za-z0-9]+")
+
+# tokens are ASCII alphanumerics, so skip the Unicode tables
+_TOKEN_RE = re.compile(r"[A-Za-z0-9]+", re.ASCII)
+
+# surface forms whose stem is remembered per Tokenizer; token frequencies are Zipfian,
+# so a cache this size answers almost every lookup after the first few hundred pages
+_STEM_CACHE_SIZE = 1 << 18
 
 
 class Tokenizer:
     def __init__(self, use_stem: bool = True):
         self.use_stem = use_stem
-        self.stemmer: Optional[PorterStemmer] = PorterStemmer() if use_stem else None
+        # PyStemmer's Porter stemmer runs in C; stemWords stems the whole token list in one call
+        # and consults its built-in token -> stem cache before running the algorithm.
+        # Build one Tokenizer per process: the cache is not shared across workers.
+        self.stemmer: Optional[Stemmer.Stemmer] = (
+            Stemmer.Stemmer("porter", _STEM_CACHE_SIZE) if use_stem else None
+        )
 
     def tokenize(self, text: str) -> List[str]:
         if not text:
             return []
         tokens = _TOKEN_RE.findall(text.lower())
         if self.use_stem and self.stemmer is not None:
-            return [self.stemmer.stem(t) for t in tokens]
-        return tokens
\ No newline at end of file
+            tokens = self.stemmer.stemWords(tokens)
+            # classic Porter reduces a bare "s" to ""
+            if "" in tokens:
+                tokens = [t for t in tokens if t]
+        # the same few thousand terms repeat across every document: share one str object each
+        return list(map(sys.intern, tokens))